@@ -4,25 +4,32 @@ IBGE • Nomes (Censo 2010) — App completo v5
 - Mantém TODAS as abas e presets (Visão geral, Ranking, Série, Evoluções, Totais, Evolução global).
 - Textos padronizados: "Top Nomes (N)".
 - Evoluções reescrita (sem hacks de locals) + presets funcionais via session_state.
-- HTTP com User-Agent e tentativas simples.
+- HTTP com sessão persistente (keep-alive), User-Agent e retentativas via adapter.
 - KPIs de totais + "registros retornados" (linhas da API) por sexo.
 - População Brasil (projeção) com mensagens claras.
 """
 
-from typing import Any, Dict, List, Optional
+from typing import TYPE_CHECKING, Any, Dict, List, Optional, Tuple
+from concurrent.futures import ThreadPoolExecutor
 import re
-import time
 
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+import numpy as np
 import pandas as pd
 import streamlit as st
-import altair as alt
+
+if TYPE_CHECKING:
+    import altair as _altair_t  # só para anotações; o módulo é importado sob demanda por _alt()
 
 st.set_page_config(page_title="IBGE • Nomes (Censo 2010)", page_icon="📝", layout="wide")
 
 API_NOMES = "https://servicodados.ibge.gov.br/api/v2/censos/nomes"
 API_LOCALIDADES = "https://servicodados.ibge.gov.br/api/v1/localidades"
 API_POP = "https://servicodados.ibge.gov.br/api/v1/projecoes/populacao"
+MAX_WORKERS = 8  # chamadas simultâneas à API em buscas por lote
+_YEAR_RE = re.compile(r"(\d{4})")  # primeiro ano de um período ("[1930,1940[" → 1930)
 
 # ----------------- Session defaults -----------------
 if "theme_dark" not in st.session_state:
@@ -35,20 +42,22 @@ if "preset_uf" not in st.session_state:
     st.session_state.preset_uf = "SP"
 
 # ----------------- HTTP helpers -----------------
+# Sessão única (sobrevive aos reruns): reaproveita conexões TCP/TLS com o host do IBGE.
+@st.cache_resource(show_spinner=False)
+def _get_session() -> requests.Session:
+    s = requests.Session()
+    s.headers["User-Agent"] = "Mozilla/5.0 (IBGE-Nomes-Streamlit/edu-ads)"
+    s.mount("https://", HTTPAdapter(
+        pool_connections=8, pool_maxsize=32,
+        max_retries=Retry(total=3, backoff_factor=0.5, status_forcelist=(429, 500, 502, 503, 504),
+                          allowed_methods=frozenset({"GET"}), raise_on_status=False),
+    ))
+    return s
+
+SESSION = _get_session()
+
 def _http_get(url: str, params: Optional[Dict[str, Any]] = None, timeout: int = 30) -> requests.Response:
-    headers = {"User-Agent": "Mozilla/5.0 (IBGE-Nomes-Streamlit/edu-ads)"}
-    last_exc: Optional[Exception] = None
-    for i in range(3):
-        try:
-            resp = requests.get(url, params=params, headers=headers, timeout=timeout)
-            if resp.status_code == 200:
-                return resp
-        except Exception as e:
-            last_exc = e
-        time.sleep(0.5 * (i + 1))
-    if last_exc:
-        raise last_exc
-    return requests.get(url, params=params, headers=headers, timeout=timeout)
+    return SESSION.get(url, params=params, timeout=timeout)
 
 @st.cache_data(show_spinner=False, ttl=1800)
 def fetch_json(url: str, params: Optional[Dict[str, Any]] = None) -> Any:
@@ -57,49 +66,73 @@ def fetch_json(url: str, params: Optional[Dict[str, Any]] = None) -> Any:
     return r.json()
 
 # ----------------- Localidades -----------------
-@st.cache_data(show_spinner=False, ttl=86400)
+# Tabelas de referência em cache_resource: o mesmo objeto é compartilhado (sem cópia/hash
+# a cada acesso), então quem chama NÃO deve modificar o DataFrame retornado.
+@st.cache_resource(show_spinner=False, ttl=86400)
 def get_estados() -> pd.DataFrame:
-    df = pd.DataFrame(fetch_json(f"{API_LOCALIDADES}/estados"))
+    rows = [{"id": x["id"], "sigla": x["sigla"], "nome": x["nome"]} for x in fetch_json(f"{API_LOCALIDADES}/estados")]
+    df = pd.DataFrame(rows, columns=["id", "sigla", "nome"])
     if df.empty: return df
-    return df[["id", "sigla", "nome"]].sort_values("nome").reset_index(drop=True)
+    return df.sort_values("nome").reset_index(drop=True)
+
+@st.cache_resource(show_spinner=False, ttl=86400)
+def _sigla_to_id() -> Dict[str, str]:
+    est = get_estados()
+    if est.empty: return {}
+    return dict(zip(est["sigla"], est["id"].astype(int).astype(str)))
+
+@st.cache_resource(show_spinner=False, ttl=86400)
+def _id_to_sigla() -> Dict[str, str]:
+    return {v: k for k, v in _sigla_to_id().items()}
 
 def get_localidade_id_por_sigla(sigla: str) -> Optional[str]:
     if not sigla: return None
-    est = get_estados()
-    row = est.loc[est["sigla"] == sigla.upper()]
-    return None if row.empty else str(int(row.iloc[0]["id"]))
+    return _sigla_to_id().get(sigla.upper())
 
-@st.cache_data(show_spinner=False, ttl=86400)
+@st.cache_resource(show_spinner=False, ttl=86400)
 def get_municipios(sigla_uf: str) -> pd.DataFrame:
     uf_id = get_localidade_id_por_sigla(sigla_uf)
     if not uf_id:
         return pd.DataFrame(columns=["id_municipio", "municipio"])
-    df = pd.DataFrame(fetch_json(f"{API_LOCALIDADES}/estados/{uf_id}/municipios"))
-    if df.empty:
+    # Só os dois campos usados: evita materializar micro/mesorregião (dicts aninhados).
+    rows = [{"id_municipio": x["id"], "municipio": x["nome"]} for x in fetch_json(f"{API_LOCALIDADES}/estados/{uf_id}/municipios")]
+    if not rows:
         return pd.DataFrame(columns=["id_municipio", "municipio"])
-    df = df.rename(columns={"id": "id_municipio", "nome": "municipio"})
-    return df[["id_municipio", "municipio"]].sort_values("municipio").reset_index(drop=True)
+    df = pd.DataFrame(rows, columns=["id_municipio", "municipio"]).sort_values("municipio").reset_index(drop=True)
+    df["_cf"] = df["municipio"].str.casefold()  # chave de busca pré-calculada (get_municipio_id)
+    return df
 
 def get_sigla_por_id(localidade_id: str) -> Optional[str]:
     try:
         lid = int(localidade_id)
     except Exception:
         return None
-    est = get_estados()
-    row = est.loc[est["id"] == lid]
-    return None if row.empty else row.iloc[0]["sigla"]
+    return _id_to_sigla().get(str(lid))
+
+@st.cache_resource(show_spinner=False, ttl=86400)
+def get_municipios_options(sigla_uf: str) -> Tuple[str, ...]:
+    """Nomes dos municípios da UF, já prontos para o selectbox."""
+    return tuple(get_municipios(sigla_uf)["municipio"])
+
+@st.cache_resource(show_spinner=False, ttl=86400)
+def _muni_maps(sigla_uf: str) -> Dict[str, str]:
+    """Nome do município (casefold) → id, por UF."""
+    df = get_municipios(sigla_uf)
+    if df.empty: return {}
+    return dict(zip(df["_cf"], df["id_municipio"].astype(int).astype(str)))
 
 def get_municipio_id(sigla_uf: str, nome_municipio: str) -> Optional[str]:
     df = get_municipios(sigla_uf)
     if df.empty: return None
     nome = (nome_municipio or "").strip()
     if not nome: return None
-    row = df[df["municipio"].str.casefold() == nome.casefold()]
-    if row.empty:
-        row = df[df["municipio"].str.contains(nome, case=False, na=False)]
-        if row.empty:
+    nome_cf = nome.casefold()
+    hit = df.loc[df["_cf"] == nome_cf, "id_municipio"]
+    if hit.empty:
+        hit = df.loc[df["_cf"].str.contains(nome_cf, regex=False, na=False), "id_municipio"]
+        if hit.empty:
             return None
-    return str(int(row.iloc[0]["id_municipio"]))
+    return str(int(hit.iloc[0]))
 
 # ----------------- População Brasil -----------------
 @st.cache_data(show_spinner=False, ttl=1800)
@@ -112,7 +145,24 @@ def get_populacao_brasil() -> Dict[str, Any]:
     except Exception as e:
         return {"ok": False, "err": str(e)}
 
+def _pop_br_cached() -> Dict[str, Any]:
+    """get_populacao_brasil() guardado na sessão; falhas não ficam presas e são refeitas."""
+    res = st.session_state.get("_pop_br")
+    if res is None:
+        res = get_populacao_brasil()
+        if res["ok"]:
+            st.session_state["_pop_br"] = res
+    return res
+
 # ----------------- API de Nomes -----------------
+def _as_int(s: pd.Series, dtype: str = "int64") -> pd.Series:
+    """Cast direto para `dtype` (caso normal da API); to_numeric só se houver nulos/strings."""
+    try:
+        return s.astype(dtype)
+    except (TypeError, ValueError):
+        return pd.to_numeric(s, errors="coerce")
+
+@st.cache_data(show_spinner=False, ttl=1800)
 def get_nome_por_decada(nome: str, sexo: Optional[str] = None, localidade: Optional[str] = None) -> pd.DataFrame:
     url = f"{API_NOMES}/{nome.strip().lower()}"
     params: Dict[str, Any] = {}
@@ -120,20 +170,19 @@ def get_nome_por_decada(nome: str, sexo: Optional[str] = None, localidade: Optio
     if localidade: params["localidade"] = localidade
     payload = fetch_json(url, params=params)
     if not payload: return pd.DataFrame()
-    rows: List[Dict[str, Any]] = []
     item = payload[0]
-    nm = item.get("nome")
-    sx = item.get("sexo") or sexo or "Todos"
-    for res in item.get("res", []):
-        periodo = res.get("periodo")
-        yrs = re.findall(r"\d{4}", str(periodo))
-        start = int(yrs[0]) if yrs else None
-        rows.append({"nome": nm or "", "sexo": sx, "periodo": periodo, "ano_inicio": start, "frequencia": res.get("frequencia")})
-    df = pd.DataFrame(rows)
-    if df.empty: return df
-    df["frequencia"] = pd.to_numeric(df["frequencia"], errors="coerce")
+    res = pd.DataFrame.from_records(item.get("res", []), columns=["periodo", "frequencia"])
+    if res.empty: return pd.DataFrame()
+    df = pd.DataFrame({
+        "nome": item.get("nome") or "",
+        "sexo": item.get("sexo") or sexo or "Todos",
+        "periodo": res["periodo"],
+        "ano_inicio": pd.to_numeric(res["periodo"].astype(str).str.extract(_YEAR_RE, expand=False), errors="coerce").astype("Int64"),
+        "frequencia": _as_int(res["frequencia"]),
+    })
     return df.sort_values("ano_inicio").reset_index(drop=True)
 
+@st.cache_data(show_spinner=False, ttl=1800)
 def get_ranking(decada: Optional[int] = None, sexo: Optional[str] = None, localidade: Optional[str] = None, qtd: Optional[int] = 20) -> pd.DataFrame:
     url = f"{API_NOMES}/ranking"
     params: Dict[str, Any] = {}
@@ -146,13 +195,10 @@ def get_ranking(decada: Optional[int] = None, sexo: Optional[str] = None, locali
         res = payload[0]["res"]
     except Exception:
         return pd.DataFrame()
-    df = pd.DataFrame(res)
-    if "frequencia" in df.columns:
-        df["frequencia"] = pd.to_numeric(df["frequencia"], errors="coerce")
-    if "ranking" in df.columns and "rank" not in df.columns:
-        df = df.rename(columns={"ranking": "rank"})
-    if "rank" in df.columns:
-        df["rank"] = pd.to_numeric(df["rank"], errors="coerce")
+    df = pd.DataFrame.from_records(res, columns=["nome", "frequencia", "ranking"]).rename(columns={"ranking": "rank"})
+    # Tipos enxutos: frequências por década cabem em int32 e o ranking (≤ 200) em Int16.
+    df["frequencia"] = _as_int(df["frequencia"], "int32")
+    df["rank"] = _as_int(df["rank"], "Int16")
     return df
 
 def get_ranking_unified(decada: Optional[int], sexo: Optional[str], localidade: Optional[str], qtd: int) -> pd.DataFrame:
@@ -160,78 +206,100 @@ def get_ranking_unified(decada: Optional[int], sexo: Optional[str], localidade:
     if not df.empty and len(df) >= qtd:
         return df.head(qtd)
     if sexo is None:
-        df_m = get_ranking(decada, "M", localidade, qtd)
-        df_f = get_ranking(decada, "F", localidade, qtd)
+        with ThreadPoolExecutor(max_workers=2) as ex:
+            fut_m = ex.submit(get_ranking, decada, "M", localidade, qtd)
+            fut_f = ex.submit(get_ranking, decada, "F", localidade, qtd)
+            df_m, df_f = fut_m.result(), fut_f.result()
         if df_m.empty and df_f.empty: return df
-        base = pd.concat([df_m.assign(sexo="M"), df_f.assign(sexo="F")], ignore_index=True)
-        if "frequencia" in base.columns:
-            agg = base.groupby("nome", as_index=False)["frequencia"].sum()
-            agg = agg.sort_values("frequencia", ascending=False).head(qtd).reset_index(drop=True)
+        parts = [d[["nome", "frequencia"]] for d in (df_m, df_f) if "frequencia" in d.columns]
+        if parts:
+            agg = pd.concat(parts, ignore_index=True).groupby("nome", as_index=False)["frequencia"].sum()
+            agg = agg.nlargest(qtd, "frequencia").reset_index(drop=True)
             agg["rank"] = range(1, len(agg) + 1)
             return agg
     return df.head(qtd) if not df.empty else df
 
-def _series_freq_for_decade(names: List[str], decada: int, sexo: Optional[str], localidade: str, sleep: float = 0.0) -> pd.DataFrame:
-    rows: List[Dict[str, Any]] = []
-    for nm in names:
-        try:
-            df = get_nome_por_decada(nm, sexo, localidade)
-            if df.empty:
-                rows.append({"nome": nm, "freq": 0}); continue
-            f = df.loc[df["ano_inicio"] == decada, "frequencia"]
-            freq = int(f.iloc[0]) if not f.empty else 0
-            rows.append({"nome": nm, "freq": freq})
-        except Exception:
-            rows.append({"nome": nm, "freq": 0})
-        if sleep: time.sleep(sleep)
-    return pd.DataFrame(rows)
+def fetch_mf_rankings(decada: Optional[int], localidade: Optional[str], qtd: int) -> Tuple[pd.DataFrame, pd.DataFrame]:
+    """Rankings masculino e feminino buscados em paralelo (a API não aceita os dois sexos numa chamada)."""
+    with ThreadPoolExecutor(max_workers=2) as ex:
+        fut_m = ex.submit(get_ranking_unified, decada, "M", localidade, qtd)
+        fut_f = ex.submit(get_ranking_unified, decada, "F", localidade, qtd)
+        return fut_m.result(), fut_f.result()
+
+def _freq_one(nm: str, decada: int, sexo: Optional[str], localidade: str) -> Dict[str, Any]:
+    # Só uma resposta vazia da API vira 0; falhas de rede/HTTP sobem, para não serem memoizadas como zero.
+    df = get_nome_por_decada(nm, sexo, localidade)
+    if df.empty:
+        return {"nome": nm, "freq": 0}
+    f = df.loc[df["ano_inicio"] == decada, "frequencia"]
+    return {"nome": nm, "freq": int(f.iloc[0]) if not f.empty else 0}
+
+def _series_freq_for_decade(names: List[str], decada: int, sexo: Optional[str], localidade: str) -> pd.DataFrame:
+    # I/O-bound: uma chamada por nome, em paralelo (ex.map preserva a ordem de `names`).
+    with ThreadPoolExecutor(max_workers=MAX_WORKERS) as ex:
+        rows = list(ex.map(lambda nm: _freq_one(nm, decada, sexo, localidade), names))
+    return pd.DataFrame(rows, columns=["nome", "freq"])
+
+def fetch_two_rankings(dec_a: int, dec_b: int, sexo: Optional[str], localidade: str, topn: int) -> Tuple[pd.DataFrame, pd.DataFrame]:
+    """Rankings das décadas A e B buscados em paralelo (latência ≈ max(t_a, t_b))."""
+    with ThreadPoolExecutor(max_workers=2) as ex:
+        a, b = ex.map(lambda d: get_ranking(d, sexo, localidade, topn), (dec_a, dec_b))
+    return a, b
 
 def growth_between_decades(dec_a: int, dec_b: int, sexo: Optional[str], localidade: str, topn: int = 200, set_mode: str = "intersect") -> pd.DataFrame:
-    a = get_ranking(dec_a, sexo, localidade, topn).rename(columns={"frequencia": "freq_a", "rank": "rank_a"})
-    b = get_ranking(dec_b, sexo, localidade, topn).rename(columns={"frequencia": "freq_b", "rank": "rank_b"})
+    a, b = fetch_two_rankings(dec_a, dec_b, sexo, localidade, topn)
+    a = a.rename(columns={"frequencia": "freq_a", "rank": "rank_a"})
+    b = b.rename(columns={"frequencia": "freq_b", "rank": "rank_b"})
     if set_mode == "intersect":
         if a.empty or b.empty: return pd.DataFrame()
-        m = pd.merge(a[["nome","freq_a","rank_a"]], b[["nome","freq_b","rank_b"]], on="nome", how="inner")
+        m = a.set_index("nome")[["freq_a","rank_a"]].join(b.set_index("nome")[["freq_b","rank_b"]], how="inner").reset_index()
     elif set_mode == "only_B":
         if b.empty: return pd.DataFrame()
         nomes_b = b["nome"].tolist()
         freqs_a = _series_freq_for_decade(nomes_b, dec_a, sexo, localidade)
-        m = pd.merge(b[["nome","freq_b","rank_b"]], freqs_a.rename(columns={"freq":"freq_a"}), on="nome", how="left")
+        m = b.set_index("nome")[["freq_b","rank_b"]].join(freqs_a.set_index("nome")["freq"].rename("freq_a"), how="left").reset_index()
         m["rank_a"] = None
     else:  # only_A
         if a.empty: return pd.DataFrame()
         nomes_a = a["nome"].tolist()
         freqs_b = _series_freq_for_decade(nomes_a, dec_b, sexo, localidade)
-        m = pd.merge(a[["nome","freq_a","rank_a"]], freqs_b.rename(columns={"freq":"freq_b"}), on="nome", how="left")
+        m = a.set_index("nome")[["freq_a","rank_a"]].join(freqs_b.set_index("nome")["freq"].rename("freq_b"), how="left").reset_index()
         m["rank_b"] = None
     if m.empty: return m
-    m["freq_a"] = pd.to_numeric(m["freq_a"], errors="coerce").fillna(0).astype(int)
-    m["freq_b"] = pd.to_numeric(m["freq_b"], errors="coerce").fillna(0).astype(int)
+    # get_ranking/_series_freq_for_decade já entregam numérico; só os nomes sem par do join ficam NaN.
+    m["freq_a"] = m["freq_a"].fillna(0).astype("int64")
+    m["freq_b"] = m["freq_b"].fillna(0).astype("int64")
     m["delta"] = (m["freq_b"] - m["freq_a"]).astype(float)
-    m["pct"] = m.apply(lambda r: (r["delta"]/r["freq_a"]*100.0) if r["freq_a"] else None, axis=1)
-    m["delta_rank"] = m.apply(lambda r: (r["rank_a"]-r["rank_b"]) if (pd.notna(r.get("rank_a")) and pd.notna(r.get("rank_b"))) else None, axis=1)
+    fa = m["freq_a"].to_numpy()
+    with np.errstate(divide="ignore", invalid="ignore"):
+        m["pct"] = np.where(fa != 0, m["delta"].to_numpy() / fa * 100.0, np.nan)
+    m["delta_rank"] = pd.to_numeric(m["rank_a"], errors="coerce") - pd.to_numeric(m["rank_b"], errors="coerce")
     return m.sort_values("delta", ascending=False).reset_index(drop=True)
 
+@st.cache_data(show_spinner=False, ttl=3600, max_entries=256)
+def _growth_cached(dec_a: int, dec_b: int, sexo: Optional[str], localidade: str, topn: int, set_mode: str) -> pd.DataFrame:
+    """growth_between_decades memoizado: reenviar o formulário com os mesmos filtros não recalcula nada."""
+    return growth_between_decades(dec_a, dec_b, sexo, localidade, topn=topn, set_mode=set_mode)
+
 # ----------------- CSS + Altair theme -----------------
-def css(dark: bool) -> str:
-    if not dark:
-        return """
-        <style>
-        #MainMenu, header, footer, [data-testid="stToolbar"], [data-testid="stDeployButton"], [data-testid="stStatusWidget"] { display:none!important; }
-        .block-container { max-width: 1220px; padding-top:.8rem; padding-bottom:2rem; }
-        .h-hero { display:flex; gap:12px; margin-bottom:.25rem; font-size:2rem; font-weight:800; }
-        .h-caption { color:#6b7280; margin-bottom:.75rem;}
-        .card { background:#fff; border:1px solid #e5e7eb; border-radius:14px; padding:18px 16px; box-shadow:0 1px 2px rgba(0,0,0,.03); margin-bottom:12px;}
-        .right { display:flex; justify-content:flex-end; }
-        .badge { display:inline-block; padding:2px 8px; border-radius:999px; border:1px solid #e5e7eb; margin-right:6px; background:#f8fafc;}
-        .grid-uf, .grid-caps { display:grid; grid-template-columns: repeat(8, minmax(0, 1fr)); gap: 8px;}
-        @media (max-width: 1200px){ .grid-uf, .grid-caps{ grid-template-columns: repeat(6, 1fr);} }
-        @media (max-width: 900px){ .grid-uf, .grid-caps{ grid-template-columns: repeat(4, 1fr);} }
-        .kpi { font-size:28px; font-weight:800; margin-bottom:-6px;}
-        .kpi-sub { color:#6b7280; font-size:13px;}
-        </style>
-        """
-    return """
+_CSS_LIGHT = """
+    <style>
+    #MainMenu, header, footer, [data-testid="stToolbar"], [data-testid="stDeployButton"], [data-testid="stStatusWidget"] { display:none!important; }
+    .block-container { max-width: 1220px; padding-top:.8rem; padding-bottom:2rem; }
+    .h-hero { display:flex; gap:12px; margin-bottom:.25rem; font-size:2rem; font-weight:800; }
+    .h-caption { color:#6b7280; margin-bottom:.75rem;}
+    .card { background:#fff; border:1px solid #e5e7eb; border-radius:14px; padding:18px 16px; box-shadow:0 1px 2px rgba(0,0,0,.03); margin-bottom:12px;}
+    .right { display:flex; justify-content:flex-end; }
+    .badge { display:inline-block; padding:2px 8px; border-radius:999px; border:1px solid #e5e7eb; margin-right:6px; background:#f8fafc;}
+    .grid-uf, .grid-caps { display:grid; grid-template-columns: repeat(8, minmax(0, 1fr)); gap: 8px;}
+    @media (max-width: 1200px){ .grid-uf, .grid-caps{ grid-template-columns: repeat(6, 1fr);} }
+    @media (max-width: 900px){ .grid-uf, .grid-caps{ grid-template-columns: repeat(4, 1fr);} }
+    .kpi { font-size:28px; font-weight:800; margin-bottom:-6px;}
+    .kpi-sub { color:#6b7280; font-size:13px;}
+    </style>
+    """
+
+_CSS_DARK = """
     <style>
     :root { --bg:#0b1220; --fg:#e5e7eb; --muted:#9ca3af; --card:#111827; --border:#1f2937; }
     html, body, .block-container { background: var(--bg)!important; color: var(--fg)!important; }
@@ -248,6 +316,9 @@ def css(dark: bool) -> str:
     </style>
     """
 
+def css(dark: bool) -> str:
+    return _CSS_DARK if dark else _CSS_LIGHT
+
 def _altair_theme(dark: bool):
     fg = "#e5e7eb" if dark else "#374151"
     grid = "#334155" if dark else "#e5e7eb"
@@ -262,11 +333,38 @@ def _altair_theme(dark: bool):
     }
 
 def enable_altair_theme(dark: bool):
-    alt.themes.register("ibge_dark", lambda: _altair_theme(True))
-    alt.themes.register("ibge_light", lambda: _altair_theme(False))
-    alt.themes.enable("ibge_dark" if dark else "ibge_light")
+    import altair as alt
+    # O registro do Altair persiste entre reruns (o módulo fica em sys.modules): registra só uma vez.
+    if "ibge_dark" not in alt.themes.names():
+        alt.themes.register("ibge_dark", lambda: _altair_theme(True))
+        alt.themes.register("ibge_light", lambda: _altair_theme(False))
+    alt.themes.enable(_theme_name(dark))
+
+def _theme_name(dark: bool) -> str:
+    return "ibge_dark" if dark else "ibge_light"
+
+def _alt():
+    """Altair carregado só quando algum gráfico é montado, já com o tema claro/escuro aplicado."""
+    import altair as alt
+    enable_altair_theme(st.session_state.theme_dark)
+    return alt
 
 # -------------- Aux UI --------------
+def scope_picker(escopo: str, prefix: str) -> Tuple[str, str]:
+    """Widgets de UF/Município conforme o escopo → (id da localidade, rótulo)."""
+    siglas = st.session_state["siglas"]
+    if escopo == "UF":
+        uf = st.selectbox("UF", siglas, index=0, key=f"{prefix}_uf")
+        return _sigla_to_id()[uf], uf
+    if escopo == "Município":
+        uf = st.selectbox("UF do município", siglas, index=0, key=f"{prefix}_uf_m")
+        opts = get_municipios_options(uf)
+        if not opts:
+            st.warning("Não foi possível carregar municípios desta UF agora."); st.stop()
+        mun = st.selectbox("Município", opts, index=0, key=f"{prefix}_mun")
+        return _muni_maps(uf)[mun.casefold()], f"{mun}/{uf}"
+    return "BR", "Brasil"
+
 def show_filters(**kwargs):
     badges = []
     for k, v in kwargs.items():
@@ -276,19 +374,29 @@ def show_filters(**kwargs):
     if badges:
         st.markdown("".join(badges), unsafe_allow_html=True)
 
-def chart_serie_decadas(df: pd.DataFrame) -> alt.Chart:
-    d = df.copy()
-    d = d.dropna(subset=["ano_inicio", "frequencia"])
-    d["ano_inicio"] = pd.to_numeric(d["ano_inicio"], errors="coerce").astype("Int64")
-    d = d.dropna(subset=["ano_inicio"]).copy()
-    d["decada"] = d["ano_inicio"].astype(int).astype(str)
-    ordem = sorted(d["ano_inicio"].dropna().unique().tolist())
-    ordem_labels = [str(int(x)) for x in ordem]
+_BR_THOUSANDS = str.maketrans(",", ".")
+
+def _br(n: int) -> str:
+    """Inteiro com separador de milhar pt-BR (1234567 → '1.234.567')."""
+    return f"{n:,}".translate(_BR_THOUSANDS)
+
+def kpi_card(value: str, sub: str):
+    st.markdown(f'<div class="card"><div class="kpi">{value}</div><div class="kpi-sub">{sub}</div></div>', unsafe_allow_html=True)
+
+@st.cache_data(show_spinner=False, ttl=1800, max_entries=64)
+def _to_csv_bytes(df: pd.DataFrame) -> bytes:
+    return df.to_csv(index=False).encode("utf-8")
+
+def chart_serie_decadas(df: pd.DataFrame) -> "_altair_t.Chart":
+    alt = _alt()
+    # dropna já devolve um novo frame; o eixo ordinal ordena as décadas sozinho.
+    d = df.dropna(subset=["ano_inicio", "frequencia"])[["nome", "sexo", "periodo", "ano_inicio", "frequencia"]]
+    d = d.assign(ano_inicio=d["ano_inicio"].astype(int))
     return (
         alt.Chart(d)
         .mark_line(point=True)
         .encode(
-            x=alt.X("decada:N", sort=ordem_labels, title="Década"),
+            x=alt.X("ano_inicio:O", title="Década"),
             y=alt.Y("frequencia:Q", title="Frequência", axis=alt.Axis(format="~s")),
             color=alt.Color("nome:N", title="Nome"),
             tooltip=["nome", "periodo", "frequencia", "sexo"],
@@ -296,6 +404,22 @@ def chart_serie_decadas(df: pd.DataFrame) -> alt.Chart:
         .properties(height=420)
     )
 
+@st.cache_data(show_spinner=False, max_entries=64)
+def _delta_bar_spec(df: pd.DataFrame, theme: str) -> Dict[str, Any]:
+    """Spec Vega-Lite das barras de Δ, em cache por dados + tema ativo (o tema entra no to_dict)."""
+    alt = _alt()
+    return (
+        alt.Chart(df[DISPLAY_COLS])
+        .mark_bar()
+        .encode(
+            x=alt.X("delta:Q", title="Δ Frequência"),
+            y=alt.Y("nome:N", sort=None),
+            tooltip=["nome", "freq_a", "freq_b", "delta", alt.Tooltip("pct:Q", format=".2f"), "delta_rank"],
+        )
+        .properties(height=max(360, 22 * len(df)))
+        .to_dict()
+    )
+
 # ----------------- Presets (Regiões/Capitais) -----------------
 REGIOES: Dict[str, List[str]] = {
     "Norte": ["AC", "AM", "AP", "PA", "RO", "RR", "TO"],
@@ -315,6 +439,20 @@ CAPITAIS: Dict[str, str] = {
     "Curitiba": "PR", "Florianópolis": "SC", "Porto Alegre": "RS",
 }
 
+# ----------------- Opções dos widgets -----------------
+DECADES_AB = (1940, 1950, 1960, 1970, 1980, 1990, 2000, 2010)  # Década B / referência
+DECADES_ALL = (1930, *DECADES_AB)
+DECADES_A = DECADES_ALL[:-1]                                    # Década A (sempre < B)
+DECADES_OPT = (None, *DECADES_ALL)                              # None = "Todas"
+ESCOPO_OPTS = ("Brasil", "UF", "Município")
+# Selectboxes guardam a chave interna; o rótulo vem do format_func.
+SEXO_OPTS = (None, "M", "F")
+SEXO_LABEL: Dict[Optional[str], str] = {None: "Todos", "M": "M", "F": "F"}
+SET_MODE_OPTS = ("intersect", "only_B", "only_A")
+SET_MODE_LABEL: Dict[str, str] = {"intersect": "Interseção A∩B", "only_B": "Só Top de B", "only_A": "Só Top de A"}
+SET_MODE_LABEL_G: Dict[str, str] = {"intersect": "Top-N de A & B (interseção)", "only_B": "Top-N só de B", "only_A": "Top-N só de A"}
+DISPLAY_COLS = ["nome", "freq_a", "freq_b", "delta", "pct", "delta_rank"]  # colunas exibidas das evoluções
+
 def render_regional_preset(region: str, dec_a=1990, dec_b=2010, top=50):
     st.caption("Clique numa UF para montar a comparação e gerar o gráfico. As 'Capitais' abaixo se ajustam para a UF selecionada.")
     ufs = REGIOES[region]
@@ -335,10 +473,9 @@ def render_regional_preset(region: str, dec_a=1990, dec_b=2010, top=50):
     st.markdown("</div>", unsafe_allow_html=True)
 
 def render_capitais_preset(dec_a=1990, dec_b=2010, top=50):
-    estados = get_estados()
     uf_atual = st.session_state.get("preset_uf", "SP")
     st.caption("Escolha uma capital para montar a análise. Selecione a UF (ou use os botões de UFs acima).")
-    uf_list = estados["sigla"].tolist()
+    uf_list = st.session_state["siglas"]
     cuf1, _ = st.columns([2, 6])
     with cuf1:
         uf_sel = st.selectbox("UF para capitais", uf_list, index=uf_list.index(uf_atual) if uf_atual in uf_list else 0)
@@ -354,7 +491,7 @@ def render_capitais_preset(dec_a=1990, dec_b=2010, top=50):
         with cols[i % 8]:
             if st.button(cap, key=f"preset_cap_{cap}_{dec_a}_{dec_b}", use_container_width=True):
                 uf = st.session_state.preset_uf
-                mid = get_municipio_id(uf, cap)
+                mid = _muni_maps(uf).get(cap.casefold()) or get_municipio_id(uf, cap)
                 if mid:
                     st.session_state.evo_params = {
                         "dec_a": dec_a, "dec_b": dec_b, "sexo": None,
@@ -365,6 +502,10 @@ def render_capitais_preset(dec_a=1990, dec_b=2010, top=50):
                     st.rerun()
     st.markdown("</div>", unsafe_allow_html=True)
 
+# ----------------- Estados (uma vez por sessão) -----------------
+if "siglas" not in st.session_state:
+    st.session_state["siglas"] = tuple(get_estados()["sigla"])
+
 # ----------------- Header -----------------
 col_h1, col_h2 = st.columns([6, 1])
 with col_h1:
@@ -377,7 +518,6 @@ with col_h2:
     st.toggle("🌗 Modo escuro", key="theme_dark")
 
 st.markdown(css(st.session_state.theme_dark), unsafe_allow_html=True)
-enable_altair_theme(st.session_state.theme_dark)
 
 # ----------------- Tabs -----------------
 tab_home, tab_rank, tab_serie, tab_evo, tab_totais, tab_global, tab_pop = st.tabs(
@@ -387,29 +527,15 @@ tab_home, tab_rank, tab_serie, tab_evo, tab_totais, tab_global, tab_pop = st.tab
 # ---------- Visão geral ----------
 with tab_home:
     st.subheader("Resumo rápido")
-    estados = get_estados()
     with st.form("form_home"):
         st.markdown('<div class="card">', unsafe_allow_html=True)
         c1, c2, c3 = st.columns(3)
         with c1:
-            escopo = st.selectbox("Escopo", ["Brasil", "UF", "Município"], index=0)
+            escopo = st.selectbox("Escopo", ESCOPO_OPTS, index=0)
         with c2:
-            decadas = [None, 1930, 1940, 1950, 1960, 1970, 1980, 1990, 2000, 2010]
-            decada = st.selectbox("Década (opcional)", decadas, format_func=lambda x: "Todas" if x is None else str(x))
+            decada = st.selectbox("Década (opcional)", DECADES_OPT, format_func=lambda x: "Todas" if x is None else str(x))
         with c3:
-            localidade_val = "BR"; localidade_label = "Brasil"
-            if escopo == "UF":
-                uf = st.selectbox("UF", estados["sigla"].tolist(), index=0)
-                localidade_val = str(int(estados.loc[estados["sigla"] == uf, "id"].iloc[0]))
-                localidade_label = uf
-            elif escopo == "Município":
-                uf = st.selectbox("UF do município", estados["sigla"].tolist(), index=0, key="home_uf_m")
-                mdf = get_municipios(uf)
-                if mdf.empty:
-                    st.warning("Não foi possível carregar municípios desta UF agora."); st.stop()
-                mun = st.selectbox("Município", mdf["municipio"].tolist(), index=0)
-                localidade_val = str(int(mdf.loc[mdf["municipio"] == mun, "id_municipio"].iloc[0]))
-                localidade_label = f"{mun}/{uf}"
+            localidade_val, localidade_label = scope_picker(escopo, "home")
         st.markdown('<div class="right">', unsafe_allow_html=True)
         submit_home = st.form_submit_button("Atualizar resumo")
         st.markdown('</div></div>', unsafe_allow_html=True)
@@ -426,6 +552,7 @@ with tab_home:
             st.dataframe(dfx[[c for c in ["nome","frequencia","rank"] if c in dfx.columns]], use_container_width=True, hide_index=True)
             if "frequencia" in dfx.columns:
                 dplot = dfx.sort_values("frequencia", ascending=True)
+                alt = _alt()
                 ch = alt.Chart(dplot).mark_bar().encode(
                     x=alt.X("frequencia:Q", title="Frequência"),
                     y=alt.Y("nome:N", sort=None, title="Nome"),
@@ -433,8 +560,7 @@ with tab_home:
                 ).properties(height=max(320, 24*len(dplot)))
                 st.altair_chart(ch, use_container_width=True)
         try:
-            df_m = get_ranking_unified(decada if decada else None, "M", localidade_val, 10)
-            df_f = get_ranking_unified(decada if decada else None, "F", localidade_val, 10)
+            df_m, df_f = fetch_mf_rankings(decada if decada else None, localidade_val, 10)
             with c1: render_top(df_m, "Top 10 Masculinos")
             with c2: render_top(df_f, "Top 10 Femininos")
         except Exception as e:
@@ -443,46 +569,33 @@ with tab_home:
 # ---------- Ranking ----------
 with tab_rank:
     st.subheader("Ranking detalhado")
-    estados = get_estados()
     with st.form("form_rank"):
         st.markdown('<div class="card">', unsafe_allow_html=True)
         c1, c2, c3 = st.columns(3)
         with c1:
-            escopo_r = st.selectbox("Escopo", ["Brasil", "UF", "Município"], index=0)
+            escopo_r = st.selectbox("Escopo", ESCOPO_OPTS, index=0)
         with c2:
-            decada_r = st.selectbox("Década (opcional)", [None,1930,1940,1950,1960,1970,1980,1990,2000,2010],
+            decada_r = st.selectbox("Década (opcional)", DECADES_OPT,
                                     format_func=lambda x: "Todas" if x is None else str(x))
         with c3:
-            sexo_r = st.selectbox("Sexo", ["Todos","M","F"], index=0)
+            sexo_r = st.selectbox("Sexo", SEXO_OPTS, index=0, format_func=SEXO_LABEL.get)
         c4, c5 = st.columns(2)
         with c4:
             qtd = st.slider("Top Nomes (N)", 10, 200, 20, 10,
                             help="N é a quantidade de nomes mais frequentes que a API retorna (ordenados por frequência).")
             ordenar = st.radio("Ordenar por", ["Frequência","Rank"], horizontal=True)
         with c5:
-            localidade_val_r = "BR"; localidade_label_r = "Brasil"
-            if escopo_r == "UF":
-                uf_r = st.selectbox("UF", estados["sigla"].tolist(), index=0)
-                localidade_val_r = str(int(estados.loc[estados["sigla"] == uf_r, "id"].iloc[0]))
-                localidade_label_r = uf_r
-            elif escopo_r == "Município":
-                uf_r = st.selectbox("UF do município", estados["sigla"].tolist(), index=0)
-                mdf_r = get_municipios(uf_r)
-                if mdf_r.empty:
-                    st.warning("Não foi possível carregar municípios desta UF agora."); st.stop()
-                mun_r = st.selectbox("Município", mdf_r["municipio"].tolist(), index=0)
-                localidade_val_r = str(int(mdf_r.loc[mdf_r["municipio"] == mun_r, "id_municipio"].iloc[0]))
-                localidade_label_r = f"{mun_r}/{uf_r}"
+            localidade_val_r, localidade_label_r = scope_picker(escopo_r, "rank")
         st.markdown('<div class="right">', unsafe_allow_html=True)
         submit_rank = st.form_submit_button("🔎 Buscar ranking")
         st.markdown('</div></div>', unsafe_allow_html=True)
 
     if submit_rank:
-        show_filters(Escopo=escopo_r, Localidade=localidade_label_r, Sexo=sexo_r,
+        show_filters(Escopo=escopo_r, Localidade=localidade_label_r, Sexo=SEXO_LABEL[sexo_r],
                      Década=("Todas" if decada_r is None else decada_r), TopNomes=qtd)
         try:
             df_rank = get_ranking_unified(decada_r if decada_r else None,
-                                          None if sexo_r=="Todos" else sexo_r, localidade_val_r, int(qtd))
+                                          sexo_r, localidade_val_r, int(qtd))
             if df_rank.empty:
                 st.warning("Nenhum dado para esses filtros.")
             else:
@@ -491,16 +604,17 @@ with tab_rank:
                 elif "rank" in df_rank.columns:
                     df_rank = df_rank.sort_values("rank")
                 st.success(f"Exibindo Top {len(df_rank)} nomes.")
-                st.dataframe(df_rank.head(int(qtd)), use_container_width=True, hide_index=True)
-                dplot = df_rank.copy().head(int(qtd))
-                if "frequencia" in dplot.columns: dplot = dplot.sort_values("frequencia", ascending=True)
+                df_top = df_rank.head(int(qtd))
+                st.dataframe(df_top, use_container_width=True, hide_index=True)
+                dplot = df_top.sort_values("frequencia", ascending=True) if "frequencia" in df_top.columns else df_top
+                alt = _alt()
                 ch = alt.Chart(dplot).mark_bar().encode(
                     x=alt.X("frequencia:Q", title="Frequência"),
                     y=alt.Y("nome:N", sort=None, title="Nome"),
                     tooltip=[c for c in ["nome","frequencia","rank"] if c in dplot.columns],
                 ).properties(height=max(300, 18*len(dplot)))
                 st.altair_chart(ch, use_container_width=True)
-                st.download_button("⬇️ Baixar CSV", df_rank.head(int(qtd)).to_csv(index=False).encode("utf-8"),
+                st.download_button("⬇️ Baixar CSV", _to_csv_bytes(df_top),
                                    file_name="ranking_nomes_ibge.csv", mime="text/csv")
         except Exception as e:
             st.error(f"Falha ao processar ranking: {e}")
@@ -508,41 +622,26 @@ with tab_rank:
 # ---------- Série por nome ----------
 with tab_serie:
     st.subheader("Série por nome (frequência por década)")
-    estados = get_estados()
     with st.form("form_serie"):
         st.markdown('<div class="card">', unsafe_allow_html=True)
         nomes_in = st.text_input("Nome(s) (separe por |)", "maria|joão|enzo")
         c1, c2, c3 = st.columns(3)
         with c1:
-            sexo_s = st.selectbox("Sexo (opcional)", ["Todos","M","F"], index=0)
+            sexo_s = st.selectbox("Sexo (opcional)", SEXO_OPTS, index=0, format_func=SEXO_LABEL.get)
         with c2:
-            escopo_s = st.selectbox("Escopo", ["Brasil","UF","Município"], index=0)
+            escopo_s = st.selectbox("Escopo", ESCOPO_OPTS, index=0)
         with c3:
-            localidade_s = "BR"; localidade_label_s = "Brasil"
-            if escopo_s == "UF":
-                uf_s = st.selectbox("UF", estados["sigla"].tolist(), index=0)
-                localidade_s = str(int(estados.loc[estados["sigla"] == uf_s, "id"].iloc[0]))
-                localidade_label_s = uf_s
-            elif escopo_s == "Município":
-                uf_s = st.selectbox("UF do município", estados["sigla"].tolist(), index=0)
-                mdf_s = get_municipios(uf_s)
-                if mdf_s.empty:
-                    st.warning("Não foi possível carregar municípios desta UF agora."); st.stop()
-                mun_s = st.selectbox("Município", mdf_s["municipio"].tolist(), index=0)
-                localidade_s = str(int(mdf_s.loc[mdf_s["municipio"] == mun_s, "id_municipio"].iloc[0]))
-                localidade_label_s = f"{mun_s}/{uf_s}"
+            localidade_s, localidade_label_s = scope_picker(escopo_s, "serie")
         st.markdown('<div class="right">', unsafe_allow_html=True)
         submit_serie = st.form_submit_button("📈 Buscar série")
         st.markdown('</div></div>', unsafe_allow_html=True)
 
     if submit_serie:
-        show_filters(Nomes=nomes_in, Sexo=sexo_s, Escopo=escopo_s, Localidade=localidade_label_s)
+        show_filters(Nomes=nomes_in, Sexo=SEXO_LABEL[sexo_s], Escopo=escopo_s, Localidade=localidade_label_s)
         try:
             nomes = [n.strip() for n in nomes_in.split("|") if n.strip()]
-            all_df: List[pd.DataFrame] = []
-            for nm in nomes:
-                df_i = get_nome_por_decada(nm, None if sexo_s=="Todos" else sexo_s, localidade_s)
-                if not df_i.empty: all_df.append(df_i)
+            with ThreadPoolExecutor(max_workers=MAX_WORKERS) as ex:
+                all_df = [d for d in ex.map(lambda n: get_nome_por_decada(n, sexo_s, localidade_s), nomes) if not d.empty]
             if not all_df:
                 st.warning("Nenhum dado encontrado.")
             else:
@@ -550,7 +649,7 @@ with tab_serie:
                 st.dataframe(df, use_container_width=True, hide_index=True)
                 st.caption("Décadas detectadas: " + ", ".join(sorted(df["ano_inicio"].dropna().astype(int).astype(str).unique())))
                 st.altair_chart(chart_serie_decadas(df), use_container_width=True)
-                st.download_button("⬇️ Baixar CSV da série", df.to_csv(index=False).encode("utf-8"),
+                st.download_button("⬇️ Baixar CSV da série", _to_csv_bytes(df),
                                    file_name="serie_nomes_ibge.csv", mime="text/csv")
         except Exception as e:
             st.error(f"Falha na série: {e}")
@@ -558,14 +657,13 @@ with tab_serie:
 # ---------- Evoluções (com presets) ----------
 with tab_evo:
     st.subheader("📈 Evoluções (comparação entre décadas)")
-    estados = get_estados()
 
     with st.expander("Presets (Top 50 por UF/Município)"):
         c0, c1, c2 = st.columns(3)
         with c0:
-            dec_a_p = st.selectbox("Década A", [1930,1940,1950,1960,1970,1980,1990,2000], index=6)
+            dec_a_p = st.selectbox("Década A", DECADES_A, index=6)
         with c1:
-            dec_b_p = st.selectbox("Década B", [1940,1950,1960,1970,1980,1990,2000,2010], index=7)
+            dec_b_p = st.selectbox("Década B", DECADES_AB, index=7)
         with c2:
             top_p = st.slider("Top Nomes (N)", 20, 200, 50, 10)
 
@@ -593,31 +691,19 @@ with tab_evo:
         st.markdown('<div class="card">', unsafe_allow_html=True)
         c1, c2, c3, c4 = st.columns(4)
         with c1:
-            dec_a = st.selectbox("Década A", [1930,1940,1950,1960,1970,1980,1990,2000], index=6, key="evo_a")
+            dec_a = st.selectbox("Década A", DECADES_A, index=6, key="evo_a")
         with c2:
-            dec_b = st.selectbox("Década B", [1940,1950,1960,1970,1980,1990,2000,2010], index=7, key="evo_b")
+            dec_b = st.selectbox("Década B", DECADES_AB, index=7, key="evo_b")
         with c3:
-            sexo_e = st.selectbox("Sexo", ["Todos","M","F"], index=0, key="evo_sx")
+            sexo_e = st.selectbox("Sexo", SEXO_OPTS, index=0, format_func=SEXO_LABEL.get, key="evo_sx")
         with c4:
-            set_mode = st.selectbox("Conjunto", ["Interseção A∩B","Só Top de B","Só Top de A"], index=0, key="evo_set")
+            set_mode = st.selectbox("Conjunto", SET_MODE_OPTS, index=0, format_func=SET_MODE_LABEL.get, key="evo_set")
         c5, c6 = st.columns(2)
         with c5:
-            escopo_e = st.selectbox("Escopo", ["Brasil","UF","Município"], index=0, key="evo_esc")
+            escopo_e = st.selectbox("Escopo", ESCOPO_OPTS, index=0, key="evo_esc")
         with c6:
             top_e = st.slider("Top Nomes (N)", 20, 200, 100, 10, key="evo_n")
-        localidade_e = "BR"; localidade_label_e = "Brasil"
-        if escopo_e == "UF":
-            uf_e = st.selectbox("UF", estados["sigla"].tolist(), index=0, key="evo_uf")
-            localidade_e = str(int(estados.loc[estados["sigla"] == uf_e, "id"].iloc[0]))
-            localidade_label_e = uf_e
-        elif escopo_e == "Município":
-            uf_e2 = st.selectbox("UF do município", estados["sigla"].tolist(), index=0, key="evo_uf_m")
-            mdf_e = get_municipios(uf_e2)
-            if mdf_e.empty:
-                st.warning("Não foi possível carregar municípios desta UF agora."); st.stop()
-            mun_e = st.selectbox("Município", mdf_e["municipio"].tolist(), index=0, key="evo_mun")
-            localidade_e = str(int(mdf_e.loc[mdf_e["municipio"] == mun_e, "id_municipio"].iloc[0]))
-            localidade_label_e = f"{mun_e}/{uf_e2}"
+        localidade_e, localidade_label_e = scope_picker(escopo_e, "evo")
         st.markdown('<div class="right">', unsafe_allow_html=True)
         submit_evo = st.form_submit_button("Gerar evolução")
         st.markdown('</div></div>', unsafe_allow_html=True)
@@ -631,7 +717,7 @@ with tab_evo:
         escopo_e = p.get("escopo", "Brasil")
         localidade_e = p.get("localidade", "BR")
         top_e = p.get("top", 50)
-        set_mode = {"intersect":"Interseção A∩B","only_B":"Só Top de B","only_A":"Só Top de A"}.get(p.get("conjunto","intersect"), "Interseção A∩B")
+        set_mode = p.get("conjunto", "intersect")
         localidade_label_e = (get_sigla_por_id(localidade_e) or localidade_label_e)
         st.session_state.evo_autorun = False
         submit_evo = True
@@ -640,51 +726,41 @@ with tab_evo:
         if dec_b <= dec_a:
             st.warning("Década B precisa ser maior que Década A.")
         else:
-            sx = None if sexo_e in (None, "Todos") else sexo_e
-            set_key = {"Interseção A∩B":"intersect","Só Top de B":"only_B","Só Top de A":"only_A"}[set_mode]
-            show_filters(Décadas=f"{dec_a} → {dec_b}", Sexo=("Todos" if sx is None else sx),
-                         Escopo=escopo_e, Localidade=localidade_label_e, TopNomes=top_e, Conjunto=set_mode)
-            base = growth_between_decades(dec_a, dec_b, sx, localidade_e, topn=int(top_e), set_mode=set_key)
-            if base.empty:
-                st.error("A API não retornou dados cruzáveis para esses filtros. Tente reduzir N ou alterar sexo/escopo.")
-            else:
-                up = base.sort_values("delta", ascending=False).head(15)
-                dn = base.sort_values("delta", ascending=True).head(15)
-                c1, c2 = st.columns(2)
-                with c1:
-                    st.markdown(f"**Quem mais cresceu ({dec_a} → {dec_b})**")
-                    st.dataframe(up[["nome","freq_a","freq_b","delta","pct","delta_rank"]],
-                                 use_container_width=True, hide_index=True)
-                    ch1 = alt.Chart(up.sort_values("delta", ascending=True)).mark_bar().encode(
-                        x=alt.X("delta:Q", title="Δ Frequência"),
-                        y=alt.Y("nome:N", sort=None),
-                        tooltip=["nome","freq_a","freq_b","delta",alt.Tooltip("pct:Q", format=".2f"),"delta_rank"],
-                    ).properties(height=max(360, 22*len(up)))
-                    st.altair_chart(ch1, use_container_width=True)
-                with c2:
-                    st.markdown(f"**Quem mais caiu ({dec_a} → {dec_b})**")
-                    st.dataframe(dn[["nome","freq_a","freq_b","delta","pct","delta_rank"]],
-                                 use_container_width=True, hide_index=True)
-                    ch2 = alt.Chart(dn.sort_values("delta", ascending=True)).mark_bar().encode(
-                        x=alt.X("delta:Q", title="Δ Frequência"),
-                        y=alt.Y("nome:N", sort=None),
-                        tooltip=["nome","freq_a","freq_b","delta",alt.Tooltip("pct:Q", format=".2f"),"delta_rank"],
-                    ).properties(height=max(360, 22*len(dn)))
-                    st.altair_chart(ch2, use_container_width=True)
+            show_filters(Décadas=f"{dec_a} → {dec_b}", Sexo=SEXO_LABEL[sexo_e],
+                         Escopo=escopo_e, Localidade=localidade_label_e, TopNomes=top_e, Conjunto=SET_MODE_LABEL[set_mode])
+            try:
+                base = _growth_cached(dec_a, dec_b, sexo_e, localidade_e, int(top_e), set_mode)
+                if base.empty:
+                    st.error("A API não retornou dados cruzáveis para esses filtros. Tente reduzir N ou alterar sexo/escopo.")
+                else:
+                    up = base.nlargest(15, "delta")
+                    dn = base.nsmallest(15, "delta")
+                    c1, c2 = st.columns(2)
+                    with c1:
+                        st.markdown(f"**Quem mais cresceu ({dec_a} → {dec_b})**")
+                        st.dataframe(up[DISPLAY_COLS],
+                                     use_container_width=True, hide_index=True)
+                        st.vega_lite_chart(_delta_bar_spec(up.iloc[::-1], _theme_name(st.session_state.theme_dark)), use_container_width=True)
+                    with c2:
+                        st.markdown(f"**Quem mais caiu ({dec_a} → {dec_b})**")
+                        st.dataframe(dn[DISPLAY_COLS],
+                                     use_container_width=True, hide_index=True)
+                        st.vega_lite_chart(_delta_bar_spec(dn, _theme_name(st.session_state.theme_dark)), use_container_width=True)
+            except Exception as e:
+                st.error(f"Falha ao gerar evolução: {e}")
 
 # ---------- Totais (KPI claro + Registros) ----------
 with tab_totais:
     st.subheader("👥 Totais — fácil de entender")
-    estados = get_estados()
 
     with st.form("form_totais_kpi"):
         st.markdown('<div class="card">', unsafe_allow_html=True)
         c1, c2, c3 = st.columns([2,2,3])
         with c1:
-            escopo_t = st.selectbox("Escopo", ["Brasil", "UF", "Município"], index=0)
+            escopo_t = st.selectbox("Escopo", ESCOPO_OPTS, index=0)
         with c2:
             dec_t = st.selectbox("Década (para 'Ranking por década')",
-                                 [None, 1930, 1940, 1950, 1960, 1970, 1980, 1990, 2000, 2010],
+                                 DECADES_OPT,
                                  format_func=lambda x: "Todas" if x is None else str(x))
         with c3:
             modo_total = st.radio("O que mostrar agora?",
@@ -692,19 +768,7 @@ with tab_totais:
                                   index=0, horizontal=False,
                                   help=("Totais do ranking somam as frequências dos nomes retornados pela API "
                                         "(até a quantidade N). População Brasil vem da projeção oficial do IBGE."))
-        localidade_t = "BR"; localidade_label_t = "Brasil"
-        if escopo_t == "UF":
-            uf_t = st.selectbox("UF", estados["sigla"].tolist(), index=0)
-            localidade_t = str(int(estados.loc[estados["sigla"] == uf_t, "id"].iloc[0]))
-            localidade_label_t = uf_t
-        elif escopo_t == "Município":
-            uf_t = st.selectbox("UF do município", estados["sigla"].tolist(), index=0)
-            mdf_t = get_municipios(uf_t)
-            if mdf_t.empty:
-                st.warning("Não foi possível carregar municípios desta UF agora."); st.stop()
-            mun_t = st.selectbox("Município", mdf_t["municipio"].tolist(), index=0)
-            localidade_t = str(int(mdf_t.loc[mdf_t["municipio"] == mun_t, "id_municipio"].iloc[0]))
-            localidade_label_t = f"{mun_t}/{uf_t}"
+        localidade_t, localidade_label_t = scope_picker(escopo_t, "tot")
 
         topn_t = None
         if modo_total == "Totais do ranking (Top Nomes)":
@@ -717,47 +781,37 @@ with tab_totais:
     if submit_tot:
         if modo_total == "Totais do ranking (Top Nomes)":
             show_filters(Escopo=escopo_t, Localidade=localidade_label_t, Década=("Todas" if dec_t is None else dec_t), N=topn_t)
-            df_m = get_ranking_unified(dec_t if dec_t else None, "M", localidade_t, topn_t)
-            df_f = get_ranking_unified(dec_t if dec_t else None, "F", localidade_t, topn_t)
-            tot_m = int(df_m["frequencia"].sum()) if not df_m.empty else 0
-            tot_f = int(df_f["frequencia"].sum()) if not df_f.empty else 0
+            df_m, df_f = fetch_mf_rankings(dec_t if dec_t else None, localidade_t, topn_t)
+            tot_m = int(np.nansum(df_m["frequencia"].to_numpy())) if len(df_m) else 0
+            tot_f = int(np.nansum(df_f["frequencia"].to_numpy())) if len(df_f) else 0
             total = tot_m + tot_f
-            reg_m = len(df_m) if not df_m.empty else 0
-            reg_f = len(df_f) if not df_f.empty else 0
+            reg_m, reg_f = len(df_m), len(df_f)
             reg_total = reg_m + reg_f
 
             kc1, kc2, kc3 = st.columns([1,1,1])
             with kc1:
-                st.markdown('<div class="card">', unsafe_allow_html=True)
-                st.markdown(f'<div class="kpi">{tot_m:,}</div>'.replace(",", "."), unsafe_allow_html=True)
-                st.markdown('<div class="kpi-sub">Masculino (soma do Top Nomes)</div>', unsafe_allow_html=True)
-                st.markdown('</div>', unsafe_allow_html=True)
+                kpi_card(_br(tot_m), "Masculino (soma do Top Nomes)")
             with kc2:
-                st.markdown('<div class="card">', unsafe_allow_html=True)
-                st.markdown(f'<div class="kpi">{tot_f:,}</div>'.replace(",", "."), unsafe_allow_html=True)
-                st.markdown('<div class="kpi-sub">Feminino (soma do Top Nomes)</div>', unsafe_allow_html=True)
-                st.markdown('</div>', unsafe_allow_html=True)
+                kpi_card(_br(tot_f), "Feminino (soma do Top Nomes)")
             with kc3:
-                st.markdown('<div class="card">', unsafe_allow_html=True)
-                st.markdown(f'<div class="kpi">{total:,}</div>'.replace(",", "."), unsafe_allow_html=True)
-                st.markdown('<div class="kpi-sub">Total (M + F)</div>', unsafe_allow_html=True)
-                st.markdown('</div>', unsafe_allow_html=True)
+                kpi_card(_br(total), "Total (M + F)")
 
             st.caption(f"Registros retornados — M: {reg_m} • F: {reg_f} • Total: {reg_total}")
 
             share_m = (tot_m/total*100.0) if total else 0.0
             share_f = (tot_f/total*100.0) if total else 0.0
             st.caption(f"Participação: Masculino {share_m:.1f}% • Feminino {share_f:.1f}%")
-            bars = pd.DataFrame({"sexo": ["Masculino","Feminino"], "total": [tot_m, tot_f]})
+            alt = _alt()
+            bars = alt.Data(values=[{"sexo": "Masculino", "total": tot_m}, {"sexo": "Feminino", "total": tot_f}])
             ch = alt.Chart(bars).mark_bar().encode(
                 x=alt.X("total:Q", title="Total (soma do Top Nomes)", axis=alt.Axis(format="~s")),
                 y=alt.Y("sexo:N", sort=None, title="Sexo"),
-                tooltip=["sexo", "total"],
+                tooltip=["sexo:N", "total:Q"],
             ).properties(height=160)
             st.altair_chart(ch, use_container_width=True)
 
             if escopo_t == "Brasil":
-                res = get_populacao_brasil()
+                res = _pop_br_cached()
                 if res["ok"]:
                     cobertura = total / res["pop"]
                     st.caption(f"Cobertura aproximada do Top Nomes sobre a população do Brasil: {cobertura:.1%}.")
@@ -768,14 +822,11 @@ with tab_totais:
             if escopo_t != "Brasil":
                 st.warning("A API pública de projeções só traz Brasil. Selecione Brasil no escopo.")
             else:
-                res = get_populacao_brasil()
+                res = _pop_br_cached()
                 if res["ok"]:
                     k1, k2 = st.columns([2,3])
                     with k1:
-                        st.markdown('<div class="card">', unsafe_allow_html=True)
-                        st.markdown(f'<div class="kpi">{res["pop"]:,}</div>'.replace(",", "."), unsafe_allow_html=True)
-                        st.markdown('<div class="kpi-sub">População total (projeção)</div>', unsafe_allow_html=True)
-                        st.markdown('</div>', unsafe_allow_html=True)
+                        kpi_card(_br(res["pop"]), "População total (projeção)")
                     with k2:
                         st.info("A projeção pública não é desagregada por sexo/UF/município. Use o modo 'Totais do ranking (Top Nomes)' para essas comparações.")
                 else:
@@ -786,7 +837,6 @@ with tab_totais:
 # ---------- Evolução global ----------
 with tab_global:
     st.subheader("📊 Evolução global")
-    estados = get_estados()
     sub1, sub2 = st.tabs(["🌍 Global (A→B)", "🕰️ Por década (Δ vs anterior)"])
 
     with sub1:
@@ -797,126 +847,103 @@ with tab_global:
                 only_prev = st.checkbox("Comparar com década anterior (B vs B-10)", value=False)
             with cMode:
                 set_mode_g = st.selectbox("Conjunto de nomes",
-                                          ["Top-N de A & B (interseção)", "Top-N só de B", "Top-N só de A"], index=0)
+                                          SET_MODE_OPTS, index=0, format_func=SET_MODE_LABEL_G.get)
             c1, c2, c3 = st.columns(3)
             with c2:
-                dec_b_g = st.selectbox("Década B", [1940,1950,1960,1970,1980,1990,2000,2010], index=7)
+                dec_b_g = st.selectbox("Década B", DECADES_AB, index=7)
             if only_prev:
                 dec_a_g = dec_b_g - 10
                 st.caption(f"Década A: {dec_a_g}")
             else:
                 with c1:
-                    dec_a_g = st.selectbox("Década A", [1930,1940,1950,1960,1970,1980,1990,2000], index=6)
+                    dec_a_g = st.selectbox("Década A", DECADES_A, index=6)
             with c3:
-                sexo_g = st.selectbox("Sexo", ["Todos","M","F"], index=0)
+                sexo_g = st.selectbox("Sexo", SEXO_OPTS, index=0, format_func=SEXO_LABEL.get)
             c4, c5 = st.columns(2)
             with c4:
-                escopo_g = st.selectbox("Escopo", ["Brasil","UF","Município"], index=0)
+                escopo_g = st.selectbox("Escopo", ESCOPO_OPTS, index=0)
             with c5:
                 top_g = st.slider("Top Nomes (N)", 20, 200, 100, 10)
-            localidade_g = "BR"; localidade_label_g = "Brasil"
-            if escopo_g == "UF":
-                uf_g = st.selectbox("UF", estados["sigla"].tolist(), index=0)
-                localidade_g = str(int(estados.loc[estados["sigla"] == uf_g, "id"].iloc[0]))
-                localidade_label_g = uf_g
-            elif escopo_g == "Município":
-                uf_g2 = st.selectbox("UF do município", estados["sigla"].tolist(), index=0)
-                mdf_g = get_municipios(uf_g2)
-                if mdf_g.empty:
-                    st.warning("Não foi possível carregar municípios desta UF agora."); st.stop()
-                mun_g = st.selectbox("Município", mdf_g["municipio"].tolist(), index=0)
-                localidade_g = str(int(mdf_g.loc[mdf_g["municipio"] == mun_g, "id_municipio"].iloc[0]))
-                localidade_label_g = f"{mun_g}/{uf_g2}"
+            localidade_g, localidade_label_g = scope_picker(escopo_g, "glob")
             st.markdown('<div class="right">', unsafe_allow_html=True)
             submit_glob = st.form_submit_button("Gerar análise")
             st.markdown('</div></div>', unsafe_allow_html=True)
 
         if submit_glob:
-            show_filters(Décadas=f"{dec_a_g} → {dec_b_g}", Sexo=sexo_g, Escopo=escopo_g, Localidade=localidade_label_g, N=top_g, Conjunto=set_mode_g)
-            sx = None if sexo_g == "Todos" else sexo_g
-            set_key = {"Top-N de A & B (interseção)":"intersect","Top-N só de B":"only_B","Top-N só de A":"only_A"}[set_mode_g]
-            base = growth_between_decades(dec_a_g, dec_b_g, sx, localidade_g, topn=int(top_g), set_mode=set_key)
-            if base.empty:
-                st.warning("Sem dados cruzáveis.")
-            else:
-                up = base.sort_values("delta", ascending=False).head(20)
-                dn = base.sort_values("delta", ascending=True).head(20)
-                c1, c2 = st.columns(2)
-                with c1:
-                    st.markdown("**Top crescimentos (Δ A→B)**")
-                    st.dataframe(up[["nome","freq_a","freq_b","delta","pct","delta_rank"]], use_container_width=True, hide_index=True)
-                with c2:
-                    st.markdown("**Top quedas (Δ A→B)**")
-                    st.dataframe(dn[["nome","freq_a","freq_b","delta","pct","delta_rank"]], use_container_width=True, hide_index=True)
+            show_filters(Décadas=f"{dec_a_g} → {dec_b_g}", Sexo=SEXO_LABEL[sexo_g], Escopo=escopo_g, Localidade=localidade_label_g, N=top_g,
+                         Conjunto=SET_MODE_LABEL_G[set_mode_g])
+            try:
+                base = _growth_cached(dec_a_g, dec_b_g, sexo_g, localidade_g, int(top_g), set_mode_g)
+                if base.empty:
+                    st.warning("Sem dados cruzáveis.")
+                else:
+                    up = base.nlargest(20, "delta")
+                    dn = base.nsmallest(20, "delta")
+                    c1, c2 = st.columns(2)
+                    with c1:
+                        st.markdown("**Top crescimentos (Δ A→B)**")
+                        st.dataframe(up[DISPLAY_COLS], use_container_width=True, hide_index=True)
+                    with c2:
+                        st.markdown("**Top quedas (Δ A→B)**")
+                        st.dataframe(dn[DISPLAY_COLS], use_container_width=True, hide_index=True)
+            except Exception as e:
+                st.error(f"Falha ao gerar análise: {e}")
 
     with sub2:
         with st.form("form_global_dec"):
             st.markdown('<div class="card">', unsafe_allow_html=True)
             c1, c2, c3 = st.columns(3)
             with c1:
-                dec_ref = st.selectbox("Década de referência", [1940,1950,1960,1970,1980,1990,2000,2010], index=6)
+                dec_ref = st.selectbox("Década de referência", DECADES_AB, index=6)
             with c2:
-                sexo_h = st.selectbox("Sexo", ["Todos","M","F"], index=0)
+                sexo_h = st.selectbox("Sexo", SEXO_OPTS, index=0, format_func=SEXO_LABEL.get)
             with c3:
                 top_h = st.slider("Top Nomes (N)", 20, 200, 100, 10)
             c4, c5 = st.columns(2)
             with c4:
-                escopo_h = st.selectbox("Escopo", ["Brasil","UF","Município"], index=0)
+                escopo_h = st.selectbox("Escopo", ESCOPO_OPTS, index=0)
             with c5:
                 filtro_nome = st.text_input("Buscar nome (ex.: enzo)", "enzo")
-            localidade_h = "BR"; localidade_label_h = "Brasil"
-            if escopo_h == "UF":
-                uf_h = st.selectbox("UF", estados["sigla"].tolist(), index=0)
-                localidade_h = str(int(estados.loc[estados["sigla"] == uf_h, "id"].iloc[0]))
-                localidade_label_h = uf_h
-            elif escopo_h == "Município":
-                uf_h2 = st.selectbox("UF do município", estados["sigla"].tolist(), index=0)
-                mdf_h = get_municipios(uf_h2)
-                if mdf_h.empty:
-                    st.warning("Não foi possível carregar municípios desta UF agora."); st.stop()
-                mun_h = st.selectbox("Município", mdf_h["municipio"].tolist(), index=0)
-                localidade_h = str(int(mdf_h.loc[mdf_h["municipio"] == mun_h, "id_municipio"].iloc[0]))
-                localidade_label_h = f"{mun_h}/{uf_h2}"
+            localidade_h, localidade_label_h = scope_picker(escopo_h, "dec")
             st.markdown('<div class="right">', unsafe_allow_html=True)
             submit_dec = st.form_submit_button("Gerar evolução da década")
             st.markdown('</div></div>', unsafe_allow_html=True)
 
         if submit_dec:
             dec_prev = dec_ref - 10
-            show_filters(Comparação=f"{dec_prev} → {dec_ref}", Sexo=sexo_h, Escopo=escopo_h, Localidade=localidade_label_h, N=top_h)
-            sx = None if sexo_h == "Todos" else sexo_h
-            base = growth_between_decades(dec_prev, dec_ref, sx, localidade_h, topn=int(top_h), set_mode="intersect")
-            if base.empty:
-                st.warning("Sem dados cruzáveis.")
-            else:
-                if filtro_nome:
-                    destaque = base[base["nome"].str.contains(filtro_nome, case=False, na=False)]
-                    if not destaque.empty:
-                        st.success(f"Destaques contendo '{filtro_nome}':")
-                        st.dataframe(destaque, use_container_width=True, hide_index=True)
-                up = base.sort_values("delta", ascending=False).head(20)
-                dn = base.sort_values("delta", ascending=True).head(20)
-                c1, c2 = st.columns(2)
-                with c1:
-                    st.markdown("**Top crescimentos (Δ vs década anterior)**")
-                    st.dataframe(up[["nome","freq_a","freq_b","delta","pct","delta_rank"]],
-                                 use_container_width=True, hide_index=True)
-                with c2:
-                    st.markdown("**Top quedas (Δ vs década anterior)**")
-                    st.dataframe(dn[["nome","freq_a","freq_b","delta","pct","delta_rank"]],
-                                 use_container_width=True, hide_index=True)
+            show_filters(Comparação=f"{dec_prev} → {dec_ref}", Sexo=SEXO_LABEL[sexo_h], Escopo=escopo_h, Localidade=localidade_label_h, N=top_h)
+            try:
+                base = _growth_cached(dec_prev, dec_ref, sexo_h, localidade_h, int(top_h), "intersect")
+                if base.empty:
+                    st.warning("Sem dados cruzáveis.")
+                else:
+                    if filtro_nome:
+                        destaque = base[base["nome"].str.lower().str.contains(filtro_nome.lower(), regex=False, na=False)]
+                        if not destaque.empty:
+                            st.success(f"Destaques contendo '{filtro_nome}':")
+                            st.dataframe(destaque, use_container_width=True, hide_index=True)
+                    up = base.nlargest(20, "delta")
+                    dn = base.nsmallest(20, "delta")
+                    c1, c2 = st.columns(2)
+                    with c1:
+                        st.markdown("**Top crescimentos (Δ vs década anterior)**")
+                        st.dataframe(up[DISPLAY_COLS],
+                                     use_container_width=True, hide_index=True)
+                    with c2:
+                        st.markdown("**Top quedas (Δ vs década anterior)**")
+                        st.dataframe(dn[DISPLAY_COLS],
+                                     use_container_width=True, hide_index=True)
+            except Exception as e:
+                st.error(f"Falha ao gerar evolução da década: {e}")
 
 # ---------- População BR ----------
 with tab_pop:
     st.subheader("Projeção de População — Brasil (IBGE)")
-    res = get_populacao_brasil()
+    res = _pop_br_cached()
     if res["ok"]:
         pop_br = res["pop"]
         st.success("Projeção carregada com sucesso.")
-        st.markdown('<div class="card">', unsafe_allow_html=True)
-        st.markdown(f'<div class="kpi">{pop_br:,}</div>'.replace(",", "."), unsafe_allow_html=True)
-        st.markdown('<div class="kpi-sub">População total (projeção)</div>', unsafe_allow_html=True)
-        st.markdown('</div>', unsafe_allow_html=True)
+        kpi_card(_br(pop_br), "População total (projeção)")
         st.caption("A API pública de projeções não disponibiliza desagregação por sexo/UF/município.")
     else:
         st.error("Não foi possível obter a projeção de população do IBGE.")